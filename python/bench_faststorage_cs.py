@@ -1,10 +1,16 @@
-import ctypes, os, platform, time
+import ctypes, os, platform, struct, time
+from array import array
 from enum import IntEnum
 
 # ─────────────────── 1. Wire format enums & structs ────────────────────
 class MessageKind(IntEnum): Depth = 0; Tick = 1
 class MarketFlag(IntEnum):  Buy = 1; Sell = 2; Clear = 4
 
+# plain ints for the hot path – comparing against IntEnum members is slower
+DEPTH, TICK = int(MessageKind.Depth), int(MessageKind.Tick)
+BUY, CLEAR  = int(MarketFlag.Buy), int(MarketFlag.Clear)
+DEPTH_RUN   = -1    # not on the wire: FastReader yields it for a run of DepthItems
+
 class MessageHeader(ctypes.Structure):
     _pack_ = 1
     _fields_ = [("Kind", ctypes.c_short),
@@ -26,7 +32,18 @@ class TickItem(ctypes.Structure):
                 ("Volume", ctypes.c_longlong),
                 ("Type",   ctypes.c_byte)]
 
+# The hot loop never builds the Structures above: it reads Kind in place and
+# decodes each body with one unpack_from over a raw view of the message.
+# Layouts mirror the _pack_ = 1 structs ('x' = skipped byte).
+_KIND       = MessageHeader.Kind.offset
+_DEPTH_BODY = struct.Struct("<12x q q b")      # Price, Volume, Flags
+_TICK_BODY  = struct.Struct("<4x q 8x q q")    # Time, Price, Volume (Id skipped)
+_DepthBytes = ctypes.c_char * ctypes.sizeof(DepthItem)
+_TickBytes  = ctypes.c_char * ctypes.sizeof(TickItem)
+
 # ─────────────────── 2. Native reader wrapper  ─────────────────────────
+BATCH_SIZE = 4096   # messages per read_message_batch call
+
 class FastReader:
     def __init__(self, file_path: str):
         self.lib = None
@@ -53,10 +70,14 @@ class FastReader:
                     "Please copy the correct library file from the C# project's 'publish' directory."
                 )
 
+        # CDLL releases the GIL for the duration of each native call, so
+        # decompression does not block other Python threads.
         self.lib = ctypes.CDLL(lib_path)
         self._define_signatures()
 
         self.reader_handle = ctypes.c_void_p()
+        self._out_ptr = ctypes.c_void_p()       # reused by every __next__ call
+        self._out_byref = ctypes.byref(self._out_ptr)
         file_path_bytes = file_path.encode('utf-8')
 
         result = self.lib.open_reader(file_path_bytes, ctypes.byref(self.reader_handle))
@@ -71,32 +92,91 @@ class FastReader:
         self.lib.close_reader.argtypes = [ctypes.c_void_p]
         self.lib.close_reader.restype = None
 
+        # Optional: newer native builds can return many messages per call.
+        # Pointers stay valid until the next read on the same handle.
+        self.read_batch = getattr(self.lib, "read_message_batch", None)
+        if self.read_batch is not None:
+            self.read_batch.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p),
+                                        ctypes.POINTER(ctypes.c_int32), ctypes.c_int32]
+            self.read_batch.restype = ctypes.c_int
+            self.batch_ptrs = (ctypes.c_void_p * BATCH_SIZE)()
+            self.batch_sizes = (ctypes.c_int32 * BATCH_SIZE)()
+
+        # Optional: a contiguous run of DepthItems (ending at EndOfTransaction)
+        # borrowed from the decoded block until release_run is called.
+        self.next_run = getattr(self.lib, "next_depth_run", None)
+        self.release_run = getattr(self.lib, "release_run", None)
+        if self.next_run is not None and self.release_run is not None:
+            self.next_run.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p),
+                                      ctypes.POINTER(ctypes.c_int32)]
+            self.next_run.restype = ctypes.c_int
+            self.release_run.argtypes = [ctypes.c_void_p]
+            self.release_run.restype = None
+        else:
+            self.next_run = None
+
+    @staticmethod
+    def _raise_native_error(code: int):
+        if code == -2:
+            raise IOError(
+                "Native library error: Corrupted data block. The file format is likely incorrect because it was created with an older version of the writer.")
+        elif code == -3:
+            raise IOError("Native library error: Unexpected end of file.")
+        else:
+            raise IOError(f"An unknown error occurred in the native library (code: {code}).")
+
     def __iter__(self):
+        # Batching wins over depth runs: runs fall back to one read_message per
+        # tick, which is slower on mixed stretches than a batch call.
+        if self.read_batch is not None:
+            return self._iter_batches()
+        if self.next_run is not None:
+            return self._iter_runs()
         return self
 
+    def _iter_runs(self):
+        # Yields (DEPTH_RUN, view over `count` DepthItems) while the stream is
+        # in a depth run, single (kind, addr) messages otherwise. A run is only
+        # asked for after a depth message, so tick-heavy stretches cost one
+        # read_message per message rather than an empty next_depth_run first.
+        base, count = ctypes.c_void_p(), ctypes.c_int32()
+        try_run = True
+        while True:
+            if try_run:
+                result = self.next_run(self.reader_handle, ctypes.byref(base), ctypes.byref(count))
+                if result < 0:
+                    self._raise_native_error(result)
+                if count.value:
+                    yield DEPTH_RUN, (_DepthBytes * count.value).from_address(base.value)
+                    self.release_run(self.reader_handle)    # caller is done with the view
+                    continue
+            message = next(self, None)
+            if message is None:
+                return
+            try_run = message[0] == DEPTH
+            yield message
+
+    def _iter_batches(self):
+        kind = ctypes.c_short.from_address
+        while True:
+            count = self.read_batch(self.reader_handle, self.batch_ptrs, self.batch_sizes, BATCH_SIZE)
+            if count == 0:
+                return
+            if count < 0:
+                self._raise_native_error(count)
+            for addr in self.batch_ptrs[:count]:
+                yield kind(addr + _KIND).value, addr
+
     def __next__(self):
-        message_ptr = ctypes.c_void_p()
-        message_size = self.lib.read_message(self.reader_handle, ctypes.byref(message_ptr))
+        message_size = self.lib.read_message(self.reader_handle, self._out_byref)
 
         if message_size == 0:
             raise StopIteration
         if message_size < 0:
-            if message_size == -2:
-                raise IOError(
-                    "Native library error: Corrupted data block. The file format is likely incorrect because it was created with an older version of the writer.")
-            elif message_size == -3:
-                raise IOError("Native library error: Unexpected end of file.")
-            else:
-                raise IOError(f"An unknown error occurred in the native library (code: {message_size}).")
+            self._raise_native_error(message_size)
 
-        header = ctypes.cast(message_ptr, ctypes.POINTER(MessageHeader)).contents
-
-        if header.Kind == MessageKind.Depth:
-            return ctypes.cast(message_ptr, ctypes.POINTER(DepthItem)).contents
-        elif header.Kind == MessageKind.Tick:
-            return ctypes.cast(message_ptr, ctypes.POINTER(TickItem)).contents
-        else:
-            return None
+        addr = self._out_ptr.value      # raw pointer, no Structure built
+        return ctypes.c_short.from_address(addr + _KIND).value, addr
 
     def close(self):
         if self.reader_handle and self.lib:
@@ -115,62 +195,130 @@ class FastReader:
 
 # ─────────────────── 3. Depth & trade handlers  ────────────────────────
 class DepthBook:
+    """Book keyed by raw int64 price ticks; scaled by 1e-8 only for reports."""
     def __init__(self):
-        self.bids = {}  # price → volume
+        self.bids = {}  # raw price → raw volume
         self.asks = {}
+        # cached top of book, kept current on insert; None = rescan on demand
+        self._best_bid = None
+        self._best_ask = None
 
-    def apply(self, msg: DepthItem):
-        if msg.Flags & MarketFlag.Clear:
+    def apply(self, price: int, volume: int, flags: int):
+        if flags & CLEAR:
             self.bids.clear()
             self.asks.clear()
-        side = self.bids if msg.Flags & MarketFlag.Buy else self.asks
-        price  = msg.Price  / 1e8
-        volume = msg.Volume / 1e8
-        if msg.Volume > 0:
-            side[price] = volume
+            self._best_bid = self._best_ask = None
+        if flags & BUY:
+            if volume > 0:
+                self.bids[price] = volume
+                best = self._best_bid
+                if best is not None and price > best:
+                    self._best_bid = price
+            elif self.bids.pop(price, None) is not None and price == self._best_bid:
+                self._best_bid = None
         else:
-            side.pop(price, None)
-
-    # helpers for final report
+            if volume > 0:
+                self.asks[price] = volume
+                best = self._best_ask
+                if best is not None and price < best:
+                    self._best_ask = price
+            elif self.asks.pop(price, None) is not None and price == self._best_ask:
+                self._best_ask = None
+
+    # helpers for final report – O(levels) scan only after the best was removed
     def best_bid(self):
-        return max(self.bids) if self.bids else None
+        if self._best_bid is None and self.bids:
+            self._best_bid = max(self.bids)
+        return None if self._best_bid is None else self._best_bid / 1e8
     def best_ask(self):
-        return min(self.asks) if self.asks else None
+        if self._best_ask is None and self.asks:
+            self._best_ask = min(self.asks)
+        return None if self._best_ask is None else self._best_ask / 1e8
 
-class TradeLog(list):
-    def push(self, msg: TickItem):
-        self.append((msg.Header.Time, msg.Price / 1e8, msg.Volume / 1e8))
+class TradeLog:
+    """Flat int64 array of (time, raw price, raw volume) triples – 24 bytes a
+    trade instead of a tuple of boxed ints; scale with 1e-8 when reporting."""
+    def __init__(self):
+        self.data = array("q")
+        self.push = self.data.extend    # push((time, price, volume))
+
+    def __len__(self):
+        return len(self.data) // 3
+
+    def last(self):
+        return tuple(self.data[-3:])
 
 # ─────────────────── 4. Benchmark loop  ────────────────────────────────
+def process(rdr: FastReader, depth: DepthBook, trades: TradeLog):
+    """Per-message dispatch loop, kept free of attribute lookups.
+
+    Runs in two phases so the snapshot check is only paid until the first
+    trade. Returns ``(messages, building_snapshot)``; the latter is still
+    True if no trade was seen.
+    """
+    msgs = 0
+
+    apply      = depth.apply
+    push       = trades.push
+    depth_body = _DEPTH_BODY.unpack_from
+    depth_run  = _DEPTH_BODY.iter_unpack
+    tick_body  = _TICK_BODY.unpack_from
+    depth_view = _DepthBytes.from_address
+    tick_view  = _TickBytes.from_address
+
+    messages = iter(rdr)
+
+    # phase 1: build the book until the first trade, then report it once
+    for k, addr in messages:
+        if k == DEPTH:
+            apply(*depth_body(depth_view(addr)))
+            msgs += 1
+
+        elif k == TICK:
+            push(tick_body(tick_view(addr)))
+            msgs += 1
+            bb, ba = depth.best_bid(), depth.best_ask()
+            print("\nFirst complete book:")
+            print(f"  best bid {bb:.2f}" if bb else "  best bid N/A")
+            print(f"  best ask {ba:.2f}" if ba else "  best ask N/A")
+            break
+
+        elif k == DEPTH_RUN:
+            for fields in depth_run(addr):
+                apply(*fields)
+            msgs += len(addr)
+    else:
+        return msgs, True           # stream ended while building the snapshot
+
+    # phase 2: same dispatch without any snapshot bookkeeping
+    for k, addr in messages:
+        if k == DEPTH:
+            apply(*depth_body(depth_view(addr)))
+
+        elif k == TICK:
+            push(tick_body(tick_view(addr)))
+
+        elif k == DEPTH_RUN:        # addr is a view over len(addr) DepthItems
+            for fields in depth_run(addr):
+                apply(*fields)
+            msgs += len(addr)
+            continue
+
+        else:
+            continue
+
+        msgs += 1
+
+    return msgs, False
+
 def run_benchmark(path: str):
     print(f"Benchmarking {os.path.basename(path)}")
     start = time.perf_counter()
 
     depth  = DepthBook()
     trades = TradeLog()
-    msgs   = 0
-    building_snapshot      = True
-    first_snapshot_reported = False
-
     with FastReader(path) as rdr:
-        for raw in rdr:
-            if raw is None:
-                continue
-
-            if isinstance(raw, DepthItem):
-                depth.apply(raw)
-
-            elif isinstance(raw, TickItem):
-                trades.push(raw)
-                if building_snapshot:
-                    building_snapshot = False
-                    bb, ba = depth.best_bid(), depth.best_ask()
-                    print("\nFirst complete book:")
-                    print(f"  best bid {bb:.2f}" if bb else "  best bid N/A")
-                    print(f"  best ask {ba:.2f}" if ba else "  best ask N/A")
-                    first_snapshot_reported = True
-
-            msgs += 1
+        msgs, building_snapshot = process(rdr, depth, trades)
 
     elapsed = time.perf_counter() - start
     print(f"\nProcessed {msgs:,} messages in {elapsed:.3f}s  "
@@ -185,7 +333,8 @@ def run_benchmark(path: str):
         print(f"Best ask  : {ba:.2f}" if ba else "Best ask  : N/A")
     print(f"Trades captured: {len(trades):,}")
     if trades:
-        print(f"Last trade     : {trades[-1]}")
+        t, px, vol = trades.last()
+        print(f"Last trade     : {(t, px / 1e8, vol / 1e8)}")
 
 # ─────────────────── 5. entry point  ───────────────────────────────────
 if __name__ == "__main__":
@@ -8,15 +8,23 @@ Usage
 """
 
 from __future__ import annotations
-import ctypes, os, platform, sys, time
+import ctypes, os, platform, struct, sys, time
+from array import array
 from enum import IntEnum, IntFlag
 from pathlib import Path
+from typing import Final
 
 
 # ────────────────────────── 1. on‑wire constants ──────────────────────────
 class Kind(IntEnum):  Depth, Tick, Symbol, Candle, CandleEnd = range(5)
 class Flag(IntFlag):  Buy = 1; Sell = 2; Clear = 4; EoTx = 8
 
+# plain ints for the hot loop – `int & IntFlag` dispatches to Python code
+_K_DEPTH: Final = int(Kind.Depth)
+_K_TICK:  Final = int(Kind.Tick)
+_F_BUY:   Final = int(Flag.Buy)
+_F_CLEAR: Final = int(Flag.Clear)
+
 
 # ───────────────────────── 2. minimal header view ─────────────────────────
 class _Hdr(ctypes.Structure):
@@ -25,8 +33,12 @@ class _Hdr(ctypes.Structure):
                 ("size", ctypes.c_uint16),
                 ("time", ctypes.c_int64)]
 
-# quick offsets (no full struct for every msg)
-_PX, _VOL, _FLG, _TS = 12, 20, 28, 4
+# quick field decoders (no full struct for every msg): one unpack_from over a
+# raw view of the message – px @12, vol @20, flags @28, ts @4
+_DEPTH = struct.Struct("<12x q q B")        # px, vol, flags
+_TICK  = struct.Struct("<4x q q q")         # ts, px, vol
+_DepthView = ctypes.c_char * _DEPTH.size
+_TickView  = ctypes.c_char * _TICK.size
 _SCALE = 1.0e-8
 
 
@@ -44,12 +56,32 @@ def _load() -> ctypes.CDLL:
     here = Path(__file__).resolve().parent / _libname()
     return ctypes.CDLL(here if here.exists() else _libname())
 
+# CDLL (unlike PyDLL) releases the GIL around every foreign call, so LZ4
+# decompression inside read_message already runs without holding it.
+# Messages are not handed to another thread: their pointers are only valid
+# until the next read on the same handle.
 _lib = _load()
 _lib.open_reader .argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p)]
 _lib.read_message.argtypes = [ctypes.c_void_p , ctypes.POINTER(ctypes.c_void_p)]
 _lib.close_reader.argtypes = [ctypes.c_void_p]
 _lib.open_reader .restype  = _lib.read_message.restype = ctypes.c_int
 _lib.close_reader.restype  = None
+_READ_MESSAGE = ctypes.cast(_lib.read_message, ctypes.c_void_p).value
+
+# optional C++ loop, opt‑in with FASTSTORAGE_CPP_LOOP=1 so a leftover build
+# never changes what the benchmark measures (python setup.py build_ext --inplace)
+_cloop = None
+if os.getenv("FASTSTORAGE_CPP_LOOP"):
+    import _faststorage_loop as _cloop
+
+# optional batched entry point – one FFI call per _BATCH messages; pointers
+# stay valid until the next call on the same handle
+_BATCH = 4096
+_read_batch = getattr(_lib, "read_message_batch", None)
+if _read_batch is not None:
+    _read_batch.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p),
+                            ctypes.POINTER(ctypes.c_int32), ctypes.c_int32]
+    _read_batch.restype  = ctypes.c_int
 
 
 # ───────────────────────── 4. zero‑alloc FastReader ───────────────────────
@@ -63,14 +95,28 @@ class FastReader:
         if rc or not self._h.value:
             raise OSError(f"open_reader failed ({rc}) for {path}")
         self._closed = False
-
-    def __iter__(self): return self
+        self._ptr     = ctypes.c_void_p()              # reused by __next__
+        self._ptr_ref = ctypes.byref(self._ptr)
+        self._ptrs    = (ctypes.c_void_p * _BATCH)()   # reused by every batch
+        self._sizes   = (ctypes.c_int32  * _BATCH)()
+
+    def __iter__(self):
+        return self if _read_batch is None else self._batched()
+
+    def _batched(self):
+        ptrs, sizes = self._ptrs, self._sizes
+        while True:
+            n = _read_batch(self._h, ptrs, sizes, _BATCH)
+            if n == 0:
+                return
+            if n < 0:
+                raise OSError(f"native reader error {n}")
+            yield from ptrs[:n]         # raw pointer addresses
 
     def __next__(self) -> int:
-        ptr = ctypes.c_void_p()
-        sz = _lib.read_message(self._h, ctypes.byref(ptr))
+        sz = _lib.read_message(self._h, self._ptr_ref)
         if sz > 0:
-            return ptr.value            # raw pointer address
+            return self._ptr.value      # raw pointer address
         if sz == 0:
             raise StopIteration
         raise OSError(f"native reader error {sz}")
@@ -87,66 +133,127 @@ class FastReader:
 
 
 # ───────────────────────── 5. benchmark routine ───────────────────────────
+def _consume(rdr: FastReader, bids: dict, asks: dict, trades: array,
+             # bound as defaults → LOAD_FAST instead of LOAD_GLOBAL
+             _K_DEPTH=_K_DEPTH, _K_TICK=_K_TICK,
+             _F_BUY=_F_BUY, _F_CLEAR=_F_CLEAR) -> int:
+    """Dispatch loop: fills the books/trades in place, returns message count.
+
+    Kept apart from the reporting code so the per‑message readers and the
+    dict/list methods are bound to locals instead of looked up each time.
+    """
+    cnt               = 0
+    building_snapshot = True   # True from CLEAR until first Tick
+
+    hdr = _Hdr.from_address
+    depth, depth_view = _DEPTH.unpack_from, _DepthView.from_address
+    tick,  tick_view  = _TICK.unpack_from,  _TickView.from_address
+    bids_pop, asks_pop = bids.pop, asks.pop
+    trade = trades.extend              # flat (ts, px, vol) int64 triples
+
+    msgs = iter(rdr)
+
+    # phase 1: until the first complete book has been printed
+    for addr in msgs:
+        cnt += 1
+        k = hdr(addr).kind
+
+        if k == _K_DEPTH:
+            px, vol, fl = depth(depth_view(addr))
+
+            if fl & _F_CLEAR:
+                bids.clear(); asks.clear()
+                building_snapshot = True
+
+            if fl & _F_BUY:
+                if vol > 0: bids[px] = vol
+                else:       bids_pop(px, None)
+            else:
+                if vol > 0: asks[px] = vol
+                else:       asks_pop(px, None)
+
+        elif k == _K_TICK:
+            trade(tick(tick_view(addr)))
+
+            if building_snapshot:
+                building_snapshot = False
+                if bids and asks:
+                    bb, ba = max(bids) * _SCALE, min(asks) * _SCALE
+                    print("\nFirst complete book ➜ "
+                          f"best bid {bb:.2f}, best ask {ba:.2f}")
+                    break
+    else:
+        return cnt                     # stream ended before a complete book
+
+    # phase 2: steady state – no snapshot bookkeeping left in the loop
+    for addr in msgs:
+        k = hdr(addr).kind
+
+        if k == _K_DEPTH:
+            px, vol, fl = depth(depth_view(addr))   # raw int64 px/vol –
+                                                    # scaled only when reported
+            if fl & _F_CLEAR:
+                bids.clear(); asks.clear()
+
+            if fl & _F_BUY:
+                if vol > 0: bids[px] = vol
+                else:       bids_pop(px, None)
+            else:
+                if vol > 0: asks[px] = vol
+                else:       asks_pop(px, None)
+
+        elif k == _K_TICK:
+            trade(tick(tick_view(addr)))
+
+        cnt += 1
+    return cnt
+
+
+def _consume_c(rdr: FastReader, trades: array) -> tuple:
+    """_consume() run by the C++ extension, which owns the books.
+
+    Returns (count, bid levels, ask levels, raw best bid, raw best ask).
+    """
+    cnt, n_bids, n_asks, bb, ba, first, raw = _cloop.run(_READ_MESSAGE,
+                                                         rdr._h.value)
+    if first:
+        print("\nFirst complete book ➜ "
+              f"best bid {first[0] * _SCALE:.2f}, best ask {first[1] * _SCALE:.2f}")
+    trades.frombytes(raw)
+    return cnt, n_bids, n_asks, bb, ba
+
+
 def benchmark(path: str) -> None:
     print("Starting benchmark for:", path)
+    if _cloop is not None:
+        print("Using C++ loop:", _cloop.__file__)
     t0 = time.perf_counter()
 
-    bids, asks, trades = {}, {}, []
-    cnt                       = 0
-    building_snapshot         = True   # True from CLEAR until first Tick
-    first_snapshot_printed    = False  # guard one‑off print
-
-    hdr = _Hdr.from_address
-    i64 = ctypes.c_int64.from_address
-    u8  = ctypes.c_uint8.from_address
-
+    trades = array("q")
     with FastReader(path) as rdr:
-        for addr in rdr:
-            k = hdr(addr).kind
-
-            if k == Kind.Depth:
-                px  = i64(addr + _PX ).value * _SCALE
-                vol = i64(addr + _VOL).value * _SCALE
-                fl  = u8 (addr + _FLG).value
-
-                if fl & Flag.Clear:
-                    bids.clear(); asks.clear()
-                    building_snapshot = True
-
-                book = bids if fl & Flag.Buy else asks
-                if vol > 0:
-                    book[px] = vol
-                else:
-                    book.pop(px, None)
-
-            elif k == Kind.Tick:
-                trades.append(( i64(addr + _TS ).value,
-                                i64(addr + _PX ).value * _SCALE,
-                                i64(addr + _VOL).value * _SCALE ))
-
-                if building_snapshot:
-                    building_snapshot = False
-                    if bids and asks and not first_snapshot_printed:
-                        bb, ba = max(bids), min(asks)
-                        print("\nFirst complete book ➜ "
-                              f"best bid {bb:.2f}, best ask {ba:.2f}")
-                        first_snapshot_printed = True
-
-            cnt += 1
+        if _cloop is not None:
+            cnt, n_bids, n_asks, bb, ba = _consume_c(rdr, trades)
+        else:
+            bids, asks = {}, {}
+            cnt = _consume(rdr, bids, asks, trades)
+            n_bids, n_asks = len(bids), len(asks)
+            bb = max(bids) if bids else None
+            ba = min(asks) if asks else None
 
     # ---------- final summary ----------
     dt = time.perf_counter() - t0
-    bb = max(bids) if bids else None
-    ba = min(asks) if asks else None
+    bb = bb * _SCALE if bb is not None else None
+    ba = ba * _SCALE if ba is not None else None
 
     print("\n" + "=" * 62)
     print(f"Processed {cnt:,} msgs in {dt:.3f}s  ({cnt / dt:,.1f} msg/s)")
     print("-" * 62)
-    print(f"Bids {len(bids):<6}  Asks {len(asks):<6}  "
+    print(f"Bids {n_bids:<6}  Asks {n_asks:<6}  "
           f"BestBid {bb or 'N/A':<10}  BestAsk {ba or 'N/A':<10}")
-    print(f"Trades: {len(trades):,}")
+    print(f"Trades: {len(trades) // 3:,}")
     if trades:
-        print("Last trade:", trades[-1])
+        ts, px, vol = trades[-3:]
+        print("Last trade:", (ts, px * _SCALE, vol * _SCALE))
     print("=" * 62)
 
 
@@ -0,0 +1,150 @@
+// FastStorage benchmark loop as a CPython extension (optional).
+//
+// Runs the whole read → dispatch → book update loop of
+// bench_faststorage_rust.py in C++. The native reader is called through the
+// read_message function pointer that ctypes already resolved, so the
+// extension does not link against, or dlopen, the Rust library itself.
+//
+// Build in place:  python setup.py build_ext --inplace
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <cstdint>
+#include <cstring>
+#include <new>
+#include <unordered_map>
+#include <vector>
+
+namespace {
+
+// ───────────────────────── on-wire layout (_pack_ = 1) ─────────────────────
+constexpr int16_t K_DEPTH = 0, K_TICK = 1;
+constexpr uint8_t F_BUY = 1, F_CLEAR = 4;
+constexpr size_t  OFF_TS = 4, OFF_PX = 12, OFF_VOL = 20, OFF_FLG = 28;
+
+using read_message_fn = int (*)(void*, void**);
+using Book            = std::unordered_map<int64_t, int64_t>;
+
+template <typename T>
+inline T field(const char* msg, size_t off) {
+    T v;
+    std::memcpy(&v, msg + off, sizeof v);   // unaligned-safe
+    return v;
+}
+
+template <typename Better>
+bool best_of(const Book& book, int64_t& out, Better better) {
+    if (book.empty()) return false;
+    auto it = book.begin();
+    out = it->first;
+    for (++it; it != book.end(); ++it)
+        if (better(it->first, out)) out = it->first;
+    return true;
+}
+
+PyObject* price_or_none(bool found, int64_t px) {
+    if (found) return PyLong_FromLongLong(px);
+    Py_RETURN_NONE;
+}
+
+// ───────────────────────── run(read_message, handle) ───────────────────────
+PyObject* run(PyObject*, PyObject* args) {
+    unsigned long long fn_addr, handle;
+    if (!PyArg_ParseTuple(args, "KK:run", &fn_addr, &handle))
+        return nullptr;
+    auto read_message = reinterpret_cast<read_message_fn>(fn_addr);
+
+    Book bids, asks;
+    std::vector<int64_t> trades;            // flat (ts, px, vol) triples
+    long long cnt = 0;
+    int rc = 0;
+    bool building_snapshot = true, first_found = false, out_of_memory = false;
+    int64_t first_bid = 0, first_ask = 0;
+
+    // Book/trade growth may throw std::bad_alloc; it must not escape this
+    // C-ABI function, and the GIL has to be back before raising.
+    PyThreadState* save = PyEval_SaveThread();
+    try {
+        void* ptr = nullptr;
+        while ((rc = read_message(reinterpret_cast<void*>(handle), &ptr)) > 0) {
+            const char* msg = static_cast<const char*>(ptr);
+            switch (field<int16_t>(msg, 0)) {
+            case K_DEPTH: {
+                const int64_t px  = field<int64_t>(msg, OFF_PX);
+                const int64_t vol = field<int64_t>(msg, OFF_VOL);
+                const uint8_t fl  = field<uint8_t>(msg, OFF_FLG);
+                if (fl & F_CLEAR) {
+                    bids.clear(); asks.clear();
+                    building_snapshot = true;
+                }
+                Book& book = (fl & F_BUY) ? bids : asks;
+                if (vol > 0) book[px] = vol;
+                else         book.erase(px);
+                break;
+            }
+            case K_TICK:
+                trades.push_back(field<int64_t>(msg, OFF_TS));
+                trades.push_back(field<int64_t>(msg, OFF_PX));
+                trades.push_back(field<int64_t>(msg, OFF_VOL));
+                if (building_snapshot) {
+                    building_snapshot = false;
+                    if (!first_found && !bids.empty() && !asks.empty()) {
+                        best_of(bids, first_bid, [](int64_t a, int64_t b) { return a > b; });
+                        best_of(asks, first_ask, [](int64_t a, int64_t b) { return a < b; });
+                        first_found = true;
+                    }
+                }
+                break;
+            default:
+                break;
+            }
+            ++cnt;
+        }
+    } catch (const std::bad_alloc&) {
+        out_of_memory = true;
+    }
+    PyEval_RestoreThread(save);
+
+    if (out_of_memory)
+        return PyErr_NoMemory();
+    if (rc < 0)
+        return PyErr_Format(PyExc_OSError, "native reader error %d", rc);
+
+    int64_t bb = 0, ba = 0;
+    const bool has_bb = best_of(bids, bb, [](int64_t a, int64_t b) { return a > b; });
+    const bool has_ba = best_of(asks, ba, [](int64_t a, int64_t b) { return a < b; });
+
+    PyObject* first = first_found
+        ? Py_BuildValue("(LL)", (long long)first_bid, (long long)first_ask)
+        : (Py_INCREF(Py_None), Py_None);
+    if (!first) return nullptr;
+
+    return Py_BuildValue(
+        "(LnnNNNy#)", cnt,
+        (Py_ssize_t)bids.size(), (Py_ssize_t)asks.size(),
+        price_or_none(has_bb, bb), price_or_none(has_ba, ba), first,
+        trades.empty() ? "" : reinterpret_cast<const char*>(trades.data()),
+        (Py_ssize_t)(trades.size() * sizeof(int64_t)));
+}
+
+PyMethodDef methods[] = {
+    {"run", run, METH_VARARGS,
+     "run(read_message_addr, handle) -> (count, n_bids, n_asks, best_bid, "
+     "best_ask, first_book, trades)\n\n"
+     "Drain the reader in C++. Prices are raw int64; first_book is "
+     "(bid, ask) or None; trades is bytes of native int64 (ts, px, vol) "
+     "triples."},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyModuleDef module = {
+    PyModuleDef_HEAD_INIT, "_faststorage_loop",
+    "C++ benchmark loop for FastStorage readers.", -1, methods,
+};
+
+}  // namespace
+
+PyMODINIT_FUNC PyInit__faststorage_loop(void) {
+    return PyModule_Create(&module);
+}
@@ -0,0 +1,24 @@
+"""Optional C++ loop for bench_faststorage_rust.py.
+
+    python setup.py build_ext --inplace
+"""
+from setuptools import Extension, setup
+from setuptools.command.build_ext import build_ext
+
+
+class _BuildExt(build_ext):
+    # optimisation / C++17 flags differ between MSVC and GCC/Clang
+    def build_extensions(self):
+        msvc = self.compiler.compiler_type == "msvc"
+        for ext in self.extensions:
+            ext.extra_compile_args = (["/O2", "/std:c++17", "/EHsc"] if msvc
+                                      else ["-O3", "-std=c++17"])
+        super().build_extensions()
+
+
+setup(
+    name="faststorage-loop",
+    ext_modules=[Extension("_faststorage_loop", ["faststorage_loop.cpp"],
+                           language="c++")],
+    cmdclass={"build_ext": _BuildExt},
+)